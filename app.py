@@ -1,8 +1,12 @@
+import io
+import os
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib as mpl
+from matplotlib.figure import Figure
 
 st.set_page_config(
     page_title="Dynamic Multi-Dataset Dashboard",
@@ -19,17 +23,459 @@ hide_streamlit_style = """
 """
 st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
+# --- Plot Styling (applied once per process, not on every rerun) ---
+@st.cache_resource
+def init_plot_style():
+    mpl.use('Agg')
+    sns.set_theme(style="whitegrid")
+    # Process-wide, so set here rather than from a dataset's branch, where it
+    # would leak into every figure created after that dataset was viewed
+    mpl.rcParams['figure.dpi'] = 150
+    return sns.axes_style()
+
+# Session figures keep the style they were created under, so they are dropped
+# when the style is applied anew (e.g. after the resource cache is cleared)
+plot_style = init_plot_style()
+if st.session_state.get('plot_style') is not plot_style:
+    st.session_state['plot_style'] = plot_style
+    st.session_state.pop('figures', None)
+    st.session_state.pop('rendered_figures', None)
+
 # --- Data Loading Function ---
-@st.cache_data
-def load_data(csv_path):
+def load_data(csv_path, dtype=None, usecols=None):
     try:
-        df = pd.read_csv(csv_path)
-        df.columns = df.columns.str.strip()
-        return df
+        df = pd.read_csv(csv_path, dtype=dtype, usecols=usecols, engine='pyarrow', dtype_backend='pyarrow')
+        return df.rename(columns=str.strip)
     except Exception as e:
         st.error(f"Error loading data from {csv_path}: {e}")
         return None
 
+def year_options(years):
+    # Sorted distinct years as plain Python ints, the form the sidebar widgets
+    # and the filter cache key work with
+    return np.unique(years.dropna().to_numpy(dtype=int)).tolist()
+
+# --- Per-Dataset Preprocessing (cached, runs once per dataset) ---
+# Column dtypes come from each dataset's "dtypes" entry in titles_config, and
+# "usecols" (None reads every column) skips constant columns at parse time.
+# 'category' columns are stored with their categories already sorted, so filter
+# options for them are read from .cat.categories instead of re-sorting.
+# Results are also persisted to Streamlit's disk cache, so a restarted server
+# unpickles the prepared frame instead of parsing the CSV again. 'modified'
+# (the CSV's mtime) is only there to key that cache on the file's version.
+@st.cache_data(persist="disk")
+def prepare_vgsales(csv_path, dtypes, usecols, modified):
+    data = load_data(csv_path, dtype=dtypes, usecols=usecols)
+    if data is None:
+        return None, {}
+    data.columns = (
+        data.columns.str.lower()
+        .str.replace(' ', '_')
+    )
+    # Total and bucket the ~580 distinct publishers rather than every row, then
+    # spread the bucket codes back by publisher code (missing publishers go to Others)
+    codes, uniques = pd.factorize(data['publisher'], use_na_sentinel=False)
+    uniques = pd.Index(uniques)
+    publisher_sales = pd.Series(
+        np.bincount(codes, weights=data['global_sales'].to_numpy(), minlength=len(uniques)),
+        index=uniques
+    )
+    top_publishers = publisher_sales[uniques.notna()].nlargest(10).index.tolist()
+    categories = sorted(top_publishers + ['Others'])
+    buckets = pd.Index(categories).get_indexer(uniques.where(uniques.isin(top_publishers), 'Others'))
+    data['publisher_filtered'] = pd.Categorical.from_codes(buckets[codes], categories=categories)
+
+    filter_options = {
+        'years': year_options(data['year']),
+        'genres': data['genre'].cat.categories.tolist(),
+        'publishers': data['publisher_filtered'].cat.categories.tolist()
+    }
+    return data, filter_options
+
+def parse_dates(column, date_format):
+    # Dates repeat heavily (~4k distinct values over ~120k rows), so only the
+    # distinct strings are stripped and parsed, then spread back by code.
+    codes, uniques = pd.factorize(column)
+    parsed = pd.to_datetime(pd.Index(uniques).str.strip(), format=date_format, errors='coerce')
+    return pd.Series(parsed.take(codes, allow_fill=True), index=column.index)
+
+@st.cache_data(persist="disk")
+def prepare_mikro(csv_path, dtypes, usecols, modified):
+    data = load_data(csv_path, dtype=dtypes, usecols=usecols)
+    if data is None:
+        return None, {}
+    data.columns = data.columns.str.lower().str.replace(' ', '_')
+    
+    # Convert all relevant status values to English
+    data['aktivs'] = data['aktivs'].str.strip().replace({
+        'jā': 'active',
+        'ir': 'active',
+        'nē': 'innactive',
+        'nav': 'innactive'
+    }).astype('category')
+    
+    data['registrets'] = parse_dates(data['registrets'], '%d.%m.%Y')
+    data['izslegts'] = parse_dates(data['izslegts'], '%d.%m.%Y')
+    
+    data['registration_year'] = data['registrets'].dt.year.astype('Int16')
+    data['deregistration_year'] = data['izslegts'].dt.year.astype('Int16')
+    # Whole days between the two datetime64 arrays (NaT stays NaN), in years
+    activity_days = (data['izslegts'].to_numpy() - data['registrets'].to_numpy()) / np.timedelta64(1, 'D')
+    data['activity_duration'] = np.floor(activity_days) / 365.25
+    
+    filter_options = {
+        'statuses': data['aktivs'].cat.categories.tolist(),
+        'reg_years': year_options(data['registration_year']),
+        'dereg_years': year_options(data['deregistration_year'])
+    }
+    return data, filter_options
+
+@st.cache_data(persist="disk")
+def prepare_hcmst(csv_path, dtypes, usecols, modified):
+    data = load_data(csv_path, dtype=dtypes, usecols=usecols)
+    if data is None:
+        return None, {}
+    
+    filter_options = {
+        'meeting_methods': data['q24_met_online'].cat.categories.tolist()
+    }
+    return data, filter_options
+
+@st.cache_data(persist="disk")
+def prepare_ev(csv_path, dtypes, usecols, modified):
+    data = load_data(csv_path, dtype=dtypes, usecols=usecols)
+    if data is None:
+        return None, {}
+    data.columns = (
+        data.columns.str.lower()
+        .str.replace(' ', '_')
+    )
+
+    filter_options = {
+        'regions': data['region'].cat.categories.tolist(),
+        'years': year_options(data['year']),
+        'powertrains': data['powertrain'].cat.categories.tolist(),
+        'parameters': data['parameter'].cat.categories.tolist()
+    }
+    return data, filter_options
+
+# --- Filtering Helpers ---
+def isin_mask(column, selected):
+    # Categorical columns are matched on their integer codes rather than on values,
+    # through a keep/drop lookup indexed by code. Its extra last slot stays False
+    # and is what code -1 (missing) lands on.
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        selected_codes = column.cat.categories.get_indexer(selected)
+        keep = np.zeros(len(column.cat.categories) + 1, dtype=bool)
+        keep[selected_codes[selected_codes >= 0]] = True
+        return keep[column.cat.codes.to_numpy()]
+    return np.isin(column.to_numpy(), np.asarray(selected))
+
+def apply_filters(data, filters):
+    # filters: (column, selected values, number of options) triples.
+    # A filter with every option selected is skipped; it only drops missing values.
+    masks = []
+    for column, selected, option_count in filters:
+        if len(selected) < option_count:
+            masks.append(isin_mask(data[column], selected))
+        elif data[column].hasnans:
+            masks.append(data[column].notna().to_numpy())
+    if not masks:
+        return data
+    return data.iloc[np.flatnonzero(np.logical_and.reduce(masks))]
+
+# --- Aggregation Helpers ---
+def count_by_year(years):
+    # Rows per year in one bincount pass over the small integer year range.
+    # Years without rows are left out, as value_counts() would.
+    values = years.dropna().to_numpy(dtype=np.int32)
+    if values.size == 0:
+        return pd.Series(dtype='int64')
+    first_year = values.min()
+    counts = np.bincount(values - first_year)
+    present = np.flatnonzero(counts)
+    return pd.Series(counts[present], index=present + first_year)
+
+def kde_curve(values, gridsize=200):
+    # Gaussian KDE with Scott's bandwidth over the data range, as drawn by
+    # sns.histplot(kde=True). Values are linearly binned onto the grid first, so
+    # the cost is one pass over the data plus a gridsize x gridsize kernel
+    # rather than a kernel evaluation per data point.
+    if values.size < 2 or values.std() == 0:
+        return None, None
+    bandwidth = values.std(ddof=1) * values.size ** (-1 / 5)
+    grid = np.linspace(values.min(), values.max(), gridsize)
+    position = (values - grid[0]) / (grid[1] - grid[0])
+    lower = np.minimum(position.astype(np.intp), gridsize - 2)
+    upper_weight = position - lower
+    grid_counts = (np.bincount(lower, 1 - upper_weight, minlength=gridsize)
+                   + np.bincount(lower + 1, upper_weight, minlength=gridsize))
+    kernel = np.exp(-0.5 * ((grid[:, None] - grid[None, :]) / bandwidth) ** 2)
+    density = kernel @ grid_counts / (values.size * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
+
+def split_by(data, columns):
+    # One groupby pass instead of a boolean mask per slice; keys missing from
+    # the result are slices with no rows under the current filters.
+    return dict(list(data.groupby(columns, observed=True)))
+
+def mean_or_nan(values):
+    # Arrow-backed columns give pd.NA for an empty mean; the metrics show nan
+    mean = values.mean()
+    return float('nan') if pd.isna(mean) else mean
+
+# --- Figure Reuse ---
+def get_axes(key, figsize=(8, 5), layout='tight'):
+    # Figures are kept per session and cleared for redrawing instead of being
+    # rebuilt on every rerun. st.cache_resource would share one figure between
+    # concurrent sessions, which matplotlib does not support.
+    # They are built as bare Figures, outside pyplot's global figure list, so
+    # they are freed with their session. The layout engine applies
+    # tight_layout as part of each draw.
+    figures = st.session_state.setdefault('figures', {})
+    if key not in figures:
+        fig = Figure(figsize=figsize, layout=layout)
+        figures[key] = fig, fig.subplots()
+    fig, ax = figures[key]
+    ax.cla()
+    return fig, ax
+
+@st.cache_data(max_entries=64)
+def figure_png(key, inputs, figsize, layout, dpi, _draw, _args):
+    # Shared by all sessions: a chart drawn for one visitor's selection is not
+    # drawn again for the next visitor making the same one. Only the chart key
+    # and inputs (dataset version and widget state) are hashed; the data passed
+    # in follows from them.
+    # Saved with st.pyplot's PNG settings unless a lower dpi is given.
+    fig, ax = get_axes(key, figsize, layout)
+    _draw(fig, ax, *_args)
+    png = io.BytesIO()
+    fig.savefig(png, format='png', dpi=dpi, bbox_inches='tight')
+    return png.getvalue()
+
+def show_figure(key, inputs, draw, *args, figsize=(8, 5), layout='tight', dpi=200):
+    # The PNG of each figure is kept with the widget state it was drawn for, so
+    # reruns that leave the filters untouched (e.g. toggling the data table)
+    # send it again without going through the shared cache.
+    rendered = st.session_state.setdefault('rendered_figures', {})
+    if key not in rendered or rendered[key][0] != inputs:
+        rendered[key] = (inputs, figure_png(key, inputs, figsize, layout, dpi, draw, args))
+    st.image(rendered[key][1], use_container_width=True)
+
+def draw_bars(ax, values, palette):
+    # Vertical counterpart of draw_barh, laid out like sns.countplot
+    ax.bar(values.index.astype(str), values.to_numpy(), color=sns.color_palette(palette, len(values), desat=0.75))
+    ax.xaxis.grid(False)
+
+def draw_grouped_bars(ax, table, palette):
+    # One group of bars per row and one bar per column, dodged like
+    # sns.barplot(hue=...); missing (NaN) cells leave their slot empty
+    levels = table.shape[1]
+    width = 0.8 / levels
+    positions = np.arange(len(table))
+    colors = sns.color_palette(palette, levels, desat=0.75)
+    for i, (level, color) in enumerate(zip(table.columns, colors)):
+        ax.bar(positions - 0.4 + width * (i + 0.5), table[level].to_numpy(), width, color=color, label=str(level))
+    ax.set_xticks(positions, table.index.astype(str))
+    ax.set_xlim(-0.5, len(table) - 0.5)
+    ax.xaxis.grid(False)
+
+def draw_histogram(ax, values, bins, color):
+    # Count histogram with a KDE line, like sns.histplot(kde=True), built from a
+    # single np.histogram pass and the binned kde_curve
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color=mpl.colors.to_rgba(color, 0.5))
+    grid, density = kde_curve(values)
+    if density is not None:
+        ax.plot(grid, density * values.size * (edges[1] - edges[0]), color=color)
+
+def draw_barh(ax, values, palette):
+    # Draws an already aggregated Series as horizontal bars, laid out like
+    # sns.barplot: first entry on top, colours desaturated and no grid lines
+    # along the categories.
+    ax.barh(values.index.astype(str), values.to_numpy(), color=sns.color_palette(palette, len(values), desat=0.75))
+    ax.invert_yaxis()
+    ax.yaxis.grid(False)
+
+# --- Chart Drawing (called through show_figure) ---
+def draw_yearly_counts(fig, ax, years, xlabel, ylabel):
+    counts = count_by_year(years)
+    # Plain ax.plot on the arrays, with sns.lineplot's white marker edges
+    ax.plot(counts.index.to_numpy(), counts.to_numpy(), marker='o', mec='w', mew=0.75)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+def draw_status_share(fig, ax, status_counts):
+    ax.pie(status_counts, labels=status_counts.index, autopct='%1.1f%%', 
+           colors=sns.color_palette('viridis', len(status_counts)))
+
+def draw_activity_duration(fig, ax, inactive):
+    draw_histogram(ax, inactive['activity_duration'].to_numpy(), bins=15, color='skyblue')
+    ax.set_xlabel('Duration of Activity (Years)')
+    ax.set_ylabel('Frequency')
+
+def draw_meeting_methods(fig, ax, data):
+    method_counts = data['q24_met_online'].value_counts()
+    draw_bars(ax, method_counts[method_counts > 0], 'viridis')
+    ax.set_xlabel("Meeting Method")
+    ax.set_ylabel("Count")
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+
+def draw_quality_by_method(fig, ax, data):
+    quality_counts = data.groupby(['q24_met_online', 'relationship_quality'], observed=True).size()
+    quality_counts.index = quality_counts.index.remove_unused_levels()
+    quality_pct = (
+        quality_counts / quality_counts.groupby(level=0, observed=True).transform('sum') * 100
+    ).unstack('relationship_quality')
+    draw_grouped_bars(ax, quality_pct, 'magma')
+    ax.set_xlabel("Meeting Method")
+    ax.set_ylabel("Percentage (%)")
+    ax.legend(title="Relationship Quality", bbox_to_anchor=(1, 1))
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+
+def draw_age_difference(fig, ax, data):
+    methods = data['q24_met_online'].unique().tolist()
+    age_difference = data['age_difference']
+    edges = np.histogram_bin_edges(age_difference.dropna(), bins=20)
+    # One groupby pass instead of an equality mask per method
+    age_groups = dict(list(age_difference.groupby(data['q24_met_online'], observed=True)))
+    ages_by_method = [age_groups[method].dropna().to_numpy() for method in methods]
+    # Weighted so each method's bars add up to 100%, like stat='percent'
+    ax.hist(
+        ages_by_method, bins=edges,
+        weights=[np.full(len(ages), 100 / max(len(ages), 1)) for ages in ages_by_method],
+        histtype='stepfilled', alpha=0.5, label=methods
+    )
+    ax.set_xlabel("Age Difference (Years)")
+    ax.set_ylabel("Percentage")
+    ax.legend(title="Meeting Method", reverse=True)
+
+def draw_marital_status(fig, ax, data):
+    marital_count = data.groupby(['q24_met_online', 'married'], observed=True).size().unstack(fill_value=0)
+    marital_pct = marital_count.div(marital_count.sum(axis=1), axis=0) * 100
+    marital_pct.plot(kind='bar', stacked=True, ax=ax, colormap='Set2')
+    ax.set_xlabel("Meeting Method")
+    ax.set_ylabel("Percentage of Couples (%)")
+    ax.legend(title="Marital Status", bbox_to_anchor=(1, 1))
+    for container in ax.containers:
+        ax.bar_label(container, fmt='%.1f%%', label_type='center')
+
+def draw_ev_stock(fig, ax, stock_data):
+    stock_pivot = stock_data.groupby(['year', 'powertrain'], observed=True)['value'].sum().unstack('powertrain', fill_value=0)
+    stock_pivot.plot(kind='bar', stacked=True, ax=ax, colormap='rocket')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('EV Stock (Vehicles)')
+    ax.legend(title='Powertrain', bbox_to_anchor=(1, 1))
+
+def draw_global_ev_stock(fig, ax, stock_data):
+    stock_df = stock_data.copy()
+
+    stock_df = stock_df[stock_df['powertrain'] != "FCEV"]
+
+    region_mapping = {
+        "china": "China",
+        "europe": "Europe",
+        "usa": "USA",
+        "rest of the world": "Rest of the world"
+    }
+    stock_df['region'] = stock_df['region'].astype(str).str.lower().str.strip().map(region_mapping)
+
+    stock_df = stock_df[stock_df['region'].notna()]
+
+    stock_df['region_powertrain'] = stock_df['region'] + " " + stock_df['powertrain'].astype(str)
+
+    stock_pivot = (
+        stock_df.groupby(['year', 'region_powertrain'])['value']
+        .sum()
+        .unstack(fill_value=0)
+        .sort_index()
+    )
+
+    stock_pivot_million = stock_pivot / 1e6
+
+    stock_pivot_million.plot(
+        kind='bar',
+        stacked=True,
+        ax=ax,
+        colormap='rocket'
+    )
+
+    ax.set_xlabel("Year", fontsize=16)
+    ax.set_ylabel("EV Stock (Million Vehicles)", fontsize=16)
+    ax.set_title("Global EV Stock Over Time by Region and Powertrain", fontsize=18)
+    ax.legend(title="Region + Powertrain", bbox_to_anchor=(1, 1), fontsize=12, title_fontsize=12)
+
+def draw_stock_share(fig, ax, stock_share_data):
+    draw_histogram(ax, stock_share_data['value'].to_numpy(dtype=float, na_value=np.nan), bins=20, color='skyblue')
+    ax.set_xlabel('EV Stock Share (%)')
+    ax.set_ylabel('Frequency')
+
+def draw_sales_share(fig, ax, sales_share_data):
+    # Average EV sales share across all selected years for each region
+    sales_share_overall = sales_share_data.groupby('region', observed=True)['value'].mean()
+    draw_barh(ax, sales_share_overall, 'mako')
+    ax.set_xlabel('Average EV Sales Share (%)', fontsize=12)
+    ax.set_ylabel('Region', fontsize=12)
+    ax.set_title('Overall EV Sales Share Across Selected Years', fontsize=14)
+    fig.subplots_adjust(left=0.3)  # Increase left margin to accommodate long y-axis labels
+
+# --- Client-Side Charts ---
+# Rendered by Vega-Lite in the browser instead of as PNGs, so the server only
+# aggregates and sends the values. Altair is imported inside each builder, on
+# first use, so datasets without these charts never load it.
+def barh_chart(values, value_title, label_title, palette):
+    # Horizontal bars for an already aggregated Series, in its order and with
+    # draw_barh's desaturated palette
+    import altair as alt
+    labels = values.index.astype(str).tolist()
+    rows = pd.DataFrame({'label': labels, 'value': values.to_numpy()})
+    colors = sns.color_palette(palette, len(labels), desat=0.75).as_hex()
+    return alt.Chart(rows).mark_bar().encode(
+        x=alt.X('value:Q', title=value_title),
+        y=alt.Y('label:N', title=label_title, sort=labels),
+        color=alt.Color('label:N', scale=alt.Scale(domain=labels, range=colors), legend=None)
+    )
+
+def yearly_counts_chart(years, xlabel, ylabel):
+    import altair as alt
+    counts = count_by_year(years)
+    rows = pd.DataFrame({'year': counts.index.to_numpy(), 'count': counts.to_numpy()})
+    return alt.Chart(rows).mark_line(point=True).encode(
+        x=alt.X('year:Q', title=xlabel, axis=alt.Axis(format='d')),
+        y=alt.Y('count:Q', title=ylabel)
+    )
+
+def genre_sales_chart(data):
+    genre_sales = data.groupby('genre', observed=True, sort=False)['global_sales'].sum().sort_values(ascending=False)
+    return barh_chart(genre_sales, 'Total Global Sales (Million $)', 'Genre', 'viridis')
+
+def region_sales_chart(data):
+    region_columns = {'na_sales': 'NA', 'eu_sales': 'EU', 'jp_sales': 'JP', 'other_sales': 'Other'}
+    region_sales = data[list(region_columns)].sum().rename(region_columns)
+    return barh_chart(region_sales, 'Total Sales (Million $)', 'Region', 'mako')
+
+def publisher_sales_chart(data):
+    publisher_sales = data.groupby('publisher_filtered', observed=True, sort=False)['global_sales'].sum().sort_values(ascending=False)
+    return barh_chart(publisher_sales, 'Total Global Sales (Million $)', 'Publisher', 'rocket')
+
+def ev_sales_chart(sales_data):
+    # Only the rows are sent; the per-year mean with its 95% confidence band
+    # (what sns.lineplot drew) is computed client-side.
+    import altair as alt
+    rows = sales_data[['year', 'powertrain', 'value']].astype({'year': int, 'powertrain': str})
+    base = alt.Chart(rows).encode(
+        x=alt.X('year:Q', title='Year', axis=alt.Axis(format='d')),
+        color=alt.Color(
+            'powertrain:N', title='Powertrain',
+            sort=rows['powertrain'].unique().tolist(),
+            scale=alt.Scale(scheme='viridis')
+        )
+    )
+    band = base.mark_errorband(extent='ci').encode(y=alt.Y('value:Q', title='EV Sales (Vehicles)'))
+    line = base.mark_line(point=True).encode(y=alt.Y('mean(value):Q', title='EV Sales (Vehicles)'))
+    return (band + line).properties(height=400)
+
 # --- Configuration for Each Dataset ---
 dataset_options = [
     "Global Video Game Sales",
@@ -41,6 +487,22 @@ dataset_options = [
 titles_config = {
     "Global Video Game Sales": {
         "file": "vgsales.csv",
+        # 'Global_Sales' stays float64: the per-game average is shown to two
+        # decimals, and float32 rounds some selections' mean the other way
+        "dtypes": {
+            'Year': 'Int16',
+            'Genre': 'category',
+            'NA_Sales': 'float32',
+            'EU_Sales': 'float32',
+            'JP_Sales': 'float32',
+            'Other_Sales': 'float32',
+            'Global_Sales': 'float64'
+        },
+        "usecols": None,
+        "columns": [
+            'year', 'genre', 'publisher_filtered',
+            'na_sales', 'eu_sales', 'jp_sales', 'other_sales', 'global_sales'
+        ],
         "main_title": "Video Game Sales Dashboard",
         "metric_label": "Total Global Sales",
         "chart1_title": "Top Genres by Sales",
@@ -49,6 +511,9 @@ titles_config = {
     },
     "Micro-enterprise Tax Payers": {
         "file": "pdb_munmaksataji_odata.csv",
+        "dtypes": None,
+        "usecols": None,
+        "columns": ['aktivs', 'registration_year', 'deregistration_year', 'activity_duration'],
         "main_title": "Micro-enterprise Tax Payers Dashboard (Latvia)",
         "metric_label": "Total Taxpayers",
         "chart1_title": "Distribution of Active vs Inactive Taxpayers",
@@ -57,6 +522,18 @@ titles_config = {
     },
     "How Couples Meet and Stay Together": {
         "file": "HCMST_ver_3.04.csv",
+        "dtypes": {
+            'q24_met_online': 'category',
+            'relationship_quality': 'category',
+            'married': 'category',
+            'age_difference': 'float32',
+            'how_long_relationship': 'float32'
+        },
+        "usecols": None,
+        "columns": [
+            'q24_met_online', 'relationship_quality', 'age_difference',
+            'how_long_relationship', 'married'
+        ],
         "main_title": "How Couples Meet and Stay Together Dashboard",
         "metric_label": "Total Couples",
         "chart1_title": "Distribution of Meeting Methods",
@@ -65,6 +542,17 @@ titles_config = {
     },
     "Global EV Data Explorer": {
         "file": "IEA-EV-dataEV salesHistoricalCars.csv",
+        # 'value' stays float64: vehicle counts exceed float32's exact integer range
+        "dtypes": {
+            'region': 'category',
+            'powertrain': 'category',
+            'parameter': 'category',
+            'unit': 'category',
+            'year': 'Int16'
+        },
+        # 'category' and 'mode' are constant in this extract (Historical, Cars)
+        "usecols": ['region', 'parameter', 'powertrain', 'year', 'unit', 'value'],
+        "columns": ['region', 'year', 'powertrain', 'parameter', 'unit', 'value'],
         "main_title": "Global EV Data Explorer Dashboard",
         "metric_label": "Total EV Sales",
         "chart1_title": "EV Sales Over Time by Powertrain",
@@ -74,571 +562,400 @@ titles_config = {
     }
 }
 
-# --- Sidebar: Dataset Selection ---
-selected_dataset = st.sidebar.selectbox("Select a dataset:", dataset_options)
-config = titles_config[selected_dataset]
-data = load_data(config["file"])
+dataset_loaders = {
+    "Global Video Game Sales": prepare_vgsales,
+    "Micro-enterprise Tax Payers": prepare_mikro,
+    "How Couples Meet and Stay Together": prepare_hcmst,
+    "Global EV Data Explorer": prepare_ev
+}
 
-# --- Main Title ---
-st.title(config["main_title"])
+def dataset_version(dataset_name):
+    # The CSV's mtime, part of every cache key built from the dataset so a
+    # replaced file is never mixed with results computed from the old one
+    csv_path = titles_config[dataset_name]["file"]
+    return os.path.getmtime(csv_path) if os.path.exists(csv_path) else None
 
-if data is not None:
-    if selected_dataset == "Global Video Game Sales":
-        data.columns = (
-            data.columns.str.lower()
-            .str.replace(' ', '_')
-        )
-        
-        if st.checkbox("Show Original Data Table", key="vgsales_original"):
-            st.dataframe(data)
-        
-        st.sidebar.header("Filters")
-        
-        years = sorted(data['year'].dropna().astype(int).unique())
-        selected_years = st.sidebar.multiselect("Select Year(s):", options=years, default=years)
-        if not selected_years:
-            selected_years = years
-        
-        genres = sorted(data['genre'].dropna().unique())
-        selected_genres = st.sidebar.multiselect("Select Genre(s):", options=genres, default=genres)
-        if not selected_genres:
-            selected_genres = genres
-        
-        top_publishers = data.groupby('publisher')['global_sales'].sum().nlargest(10).index.tolist()
-        publishers = sorted(list(set(top_publishers + ['Others'])))
-        data['publisher_filtered'] = data['publisher'].apply(lambda x: x if x in top_publishers else 'Others')
-        selected_publishers = st.sidebar.multiselect("Select Publisher(s):", options=publishers, default=publishers)
-        if not selected_publishers:
-            selected_publishers = publishers
-        
-        # --- Apply Filters ---
-        df_filtered = data[
-            (data['year'].isin(selected_years)) &
-            (data['genre'].isin(selected_genres)) &
-            (data['publisher_filtered'].isin(selected_publishers))
-        ]
-        
-        # --- Key Metrics ---
-        st.header("Key Metrics (Filtered Data)")
-        col1, col2, col3 = st.columns(3)
-        total_sales = df_filtered['global_sales'].sum()
-        avg_sales_per_game = df_filtered['global_sales'].mean()
-        total_games = df_filtered.shape[0]
-        col1.metric("Total Global Sales (M)", f"{total_sales:,.2f}")
-        col2.metric("Avg. Sales per Game (M)", f"{avg_sales_per_game:.2f}")
-        col3.metric("Total Games", f"{total_games:,}")
-        st.markdown("---")
-        
-        # --- Visualizations ---
-        sns.set_theme(style="whitegrid")
-        
-        # Chart 1: Top Genres by Sales (Bar Plot)
-        col1_viz, col2_viz = st.columns(2)
-        with col1_viz:
-            st.subheader(config["chart1_title"])
-            genre_sales = df_filtered.groupby('genre')['global_sales'].sum().sort_values(ascending=False)
-            fig1, ax1 = plt.subplots(figsize=(8, 5))
-            sns.barplot(
-                x=genre_sales.values,
-                y=genre_sales.index,
-                ax=ax1, palette='viridis'
-            )
-            ax1.set_xlabel('Total Global Sales (Million $)')
-            ax1.set_ylabel('Genre')
-            plt.tight_layout()
-            st.pyplot(fig1)
-        
-        # Chart 2: Sales by Region (Stacked Bar Plot)
-        with col2_viz:
-            st.subheader(config["chart2_title"])
-            region_sales = df_filtered[['na_sales', 'eu_sales', 'jp_sales', 'other_sales']].sum()
-            region_sales_df = pd.DataFrame({
-                'Region': ['NA', 'EU', 'JP', 'Other'],
-                'Sales': region_sales.values
-            })
-            fig2, ax2 = plt.subplots(figsize=(8, 5))
-            sns.barplot(
-                x='Sales',
-                y='Region',
-                data=region_sales_df,
-                ax=ax2, palette='mako'
-            )
-            ax2.set_xlabel('Total Sales (Million $)')
-            ax2.set_ylabel('Region')
-            plt.tight_layout()
-            st.pyplot(fig2)
-        
-        # Chart 3: Games Released Over Time (Line Plot)
-        col3_viz, col4_viz = st.columns(2)
-        with col3_viz:
-            st.subheader(config["chart3_title"])
-            if len(selected_years) > 1:
-                games_per_year = df_filtered['year'].value_counts().sort_index()
-                fig3, ax3 = plt.subplots(figsize=(8, 5))
-                sns.lineplot(
-                    x=games_per_year.index,
-                    y=games_per_year.values,
-                    marker='o', ax=ax3
-                )
-                ax3.set_xlabel('Year')
-                ax3.set_ylabel('Number of Games Released')
-                plt.tight_layout()
-                st.pyplot(fig3)
-            elif len(selected_years) == 1:
-                st.write(f"Showing data only for {selected_years[0]}.")
-                count = df_filtered['year'].value_counts().iloc[0]
-                st.metric(f"Games Released in {selected_years[0]}", count)
-            else:
-                st.write("Select multiple years to see trend.")
-        
-        # Chart 4: Top Publishers by Sales (Bar Plot)
-        with col4_viz:
-            st.subheader("Top Publishers by Sales")
-            publisher_sales = df_filtered.groupby('publisher_filtered')['global_sales'].sum().sort_values(ascending=False)
-            fig4, ax4 = plt.subplots(figsize=(8, 5))
-            sns.barplot(
-                x=publisher_sales.values,
-                y=publisher_sales.index,
-                ax=ax4, palette='rocket'
-            )
-            ax4.set_xlabel('Total Global Sales (Million $)')
-            ax4.set_ylabel('Publisher')
-            plt.tight_layout()
-            st.pyplot(fig4)
-    elif selected_dataset == "Micro-enterprise Tax Payers":
-        data.columns = data.columns.str.lower().str.replace(' ', '_')
-        
-        # Convert all relevant status values to English
-        data['aktivs'] = data['aktivs'].str.strip().replace({
-            'jā': 'active',
-            'ir': 'active',
-            'nē': 'innactive',
-            'nav': 'innactive'
-        })
-        
-        data['registrets'] = data['registrets'].str.strip()
-        data['izslegts'] = data['izslegts'].str.strip()
-        data['registrets'] = pd.to_datetime(data['registrets'], format='%d.%m.%Y', errors='coerce')
-        data['izslegts'] = pd.to_datetime(data['izslegts'], format='%d.%m.%Y', errors='coerce')
-        
-        data['registration_year'] = data['registrets'].dt.year
-        data['deregistration_year'] = data['izslegts'].dt.year
-        
-        if st.checkbox("Show Original Data Table", key="mikro_original"):
-            st.dataframe(data)
-        
-        st.sidebar.header("Filters")
-        
-        statuses = sorted(data['aktivs'].dropna().unique())
-        selected_statuses = st.sidebar.multiselect("Select Status:", options=statuses, default=statuses)
-        if not selected_statuses:
-            selected_statuses = statuses
-        
-        reg_years = sorted(data['registration_year'].dropna().astype(int).unique())
-        selected_reg_years = st.sidebar.multiselect("Select Registration Year(s):", options=reg_years, default=reg_years)
-        if not selected_reg_years:
-            selected_reg_years = reg_years
-        
-        dereg_years = sorted(data['deregistration_year'].dropna().astype(int).unique())
-        selected_dereg_years = st.sidebar.multiselect("Select Deregistration Year(s):", options=dereg_years, default=dereg_years)
-        if not selected_dereg_years:
-            selected_dereg_years = dereg_years
-        
-        # --- Apply Filters ---
-        df_filtered = data[
-            (data['aktivs'].isin(selected_statuses)) &
-            (data['registration_year'].isin(selected_reg_years))
-        ]
-        if 'no' in selected_statuses:
-            df_filtered = df_filtered[
-                (df_filtered['aktivs'] == 'active') |
-                ((df_filtered['aktivs'] == 'innactive') & (df_filtered['deregistration_year'].isin(selected_dereg_years)))
-            ]
-        
-        # --- Key Metrics ---
-        st.header("Key Metrics (Filtered Data)")
-        col1, col2, col3 = st.columns(3)
-        total_taxpayers = df_filtered.shape[0]
-        active_taxpayers = df_filtered[df_filtered['aktivs'] == 'active'].shape[0]
-        inactive_taxpayers = df_filtered[df_filtered['aktivs'] == 'innactive'].shape[0]
-        col1.metric("Total Taxpayers", f"{total_taxpayers:,}")
-        col2.metric("Active Taxpayers", f"{active_taxpayers:,}")
-        col3.metric("Inactive Taxpayers", f"{inactive_taxpayers:,}")
-        st.markdown("---")
-        
-        # --- Visualizations ---
-        sns.set_theme(style="whitegrid")
-        
-        # Chart 1: Distribution of Active vs Inactive Taxpayers (Pie Chart)
-        col1_viz, col2_viz = st.columns(2)
-        with col1_viz:
-            st.subheader(config["chart1_title"])
-            status_counts = df_filtered['aktivs'].value_counts()
-            fig1, ax1 = plt.subplots(figsize=(8, 5))
-            ax1.pie(status_counts, labels=status_counts.index, autopct='%1.1f%%', 
-                    colors=sns.color_palette('viridis', len(status_counts)))
-            plt.tight_layout()
-            st.pyplot(fig1)
-        
-        # Chart 2: Registrations Over Time (Line Plot)
-        with col2_viz:
-            st.subheader(config["chart2_title"])
-            if len(selected_reg_years) > 1:
-                reg_counts = df_filtered['registration_year'].value_counts().sort_index()
-                fig2, ax2 = plt.subplots(figsize=(8, 5))
-                sns.lineplot(x=reg_counts.index, y=reg_counts.values, marker='o', ax=ax2)
-                ax2.set_xlabel('Registration Year')
-                ax2.set_ylabel('Number of Registrations')
-                plt.tight_layout()
-                st.pyplot(fig2)
-            elif len(selected_reg_years) == 1:
-                st.write(f"Showing data only for registration year {selected_reg_years[0]}.")
-                reg_count = df_filtered['registration_year'].value_counts().iloc[0]
-                st.metric(f"Registrations in {selected_reg_years[0]}", f"{reg_count:,}")
-            else:
-                st.write("Select multiple registration years to see trend.")
-        
-        # Chart 3: Deregistrations Over Time (Line Plot)
-        col3_viz, col4_viz = st.columns(2)
-        with col3_viz:
-            st.subheader(config["chart3_title"])
-            inactive_df = df_filtered[df_filtered['aktivs'] == 'innactive']
-            if len(selected_dereg_years) > 1 and not inactive_df.empty:
-                dereg_counts = inactive_df['deregistration_year'].value_counts().sort_index()
-                fig3, ax3 = plt.subplots(figsize=(8, 5))
-                sns.lineplot(x=dereg_counts.index, y=dereg_counts.values, marker='o', ax=ax3)
-                ax3.set_xlabel('Deregistration Year')
-                ax3.set_ylabel('Number of Deregistrations')
-                plt.tight_layout()
-                st.pyplot(fig3)
-            elif len(selected_dereg_years) == 1 and not inactive_df.empty:
-                st.write(f"Showing data only for deregistration year {selected_dereg_years[0]}.")
-                dereg_count = inactive_df['deregistration_year'].value_counts().iloc[0]
-                st.metric(f"Deregistrations in {selected_dereg_years[0]}", f"{dereg_count:,}")
-            else:
-                st.write("Select multiple deregistration years to see trend, or ensure inactive taxpayers are included.")
-
-        
-        # Chart 4: Duration of Activity (Histogram)
-        with col4_viz:
-            st.subheader("Duration of Activity (Inactive Taxpayers)")
-            if not inactive_df.empty:
-                inactive_df['activity_duration'] = (inactive_df['izslegts'] - inactive_df['registrets']).dt.days / 365.25  # Convert to years
-                fig4, ax4 = plt.subplots(figsize=(8, 5))
-                sns.histplot(
-                    inactive_df['activity_duration'],
-                    kde=True, bins=15, ax=ax4, color='skyblue'
-                )
-                ax4.set_xlabel('Duration of Activity (Years)')
-                ax4.set_ylabel('Frequency')
-                plt.tight_layout()
-                st.pyplot(fig4)
-            else:
-                st.write("No inactive taxpayers in the filtered data to show duration.")
-
-    elif selected_dataset == "How Couples Meet and Stay Together":
-        if st.checkbox("Show Original Data Table", key="hcmst_original"):
-            st.dataframe(data)
-        data.columns = data.columns.str.strip()
-        
-        # --- Sidebar Filters ---
-        st.sidebar.header("Filters")
-        meeting_methods = data['q24_met_online'].dropna().unique().tolist()
-        selected_methods = st.sidebar.multiselect("Select Meeting Method(s):", options=meeting_methods, default=meeting_methods)
-        if not selected_methods:
-            selected_methods = meeting_methods
-        
-        # --- Apply Filters ---
-        df_filtered = data[data['q24_met_online'].isin(selected_methods)]
-        
-        # --- Key Metrics ---
-        st.header("Key Metrics (Filtered Data)")
-        col1, col2 = st.columns(2)
-        total_couples = df_filtered.shape[0]
-        avg_duration = df_filtered['how_long_relationship'].mean()
-        col1.metric("Total Couples", f"{total_couples}")
-        col2.metric("Avg. Relationship Duration (Years)", f"{avg_duration:.1f}")
-        st.markdown("---")
-        
-        # --- Visualizations ---
-        sns.set_theme(style="whitegrid")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader(config["chart1_title"])
-            fig1, ax1 = plt.subplots(figsize=(8, 5))
-            sns.countplot(
-                data=df_filtered,
-                x='q24_met_online',
-                order=df_filtered['q24_met_online'].value_counts().index,
-                ax=ax1,
-                palette="viridis"
-            )
-            ax1.set_xlabel("Meeting Method")
-            ax1.set_ylabel("Count")
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            st.pyplot(fig1)
-        
-        with col2:
-            st.subheader(config["chart2_title"])
-            quality_pct = pd.crosstab(
-                df_filtered['q24_met_online'],
-                df_filtered['relationship_quality'],
-                normalize='index'
-            ) * 100
-            quality_pct = quality_pct.reset_index().melt(
-                id_vars='q24_met_online',
-                var_name='relationship_quality',
-                value_name='percentage'
-            )
-            fig2, ax2 = plt.subplots(figsize=(8, 5))
-            sns.barplot(
-                data=quality_pct,
-                x='q24_met_online',
-                y='percentage',
-                hue='relationship_quality',
-                ax=ax2,
-                palette="magma"
-            )
-            ax2.set_xlabel("Meeting Method")
-            ax2.set_ylabel("Percentage (%)")
-            ax2.legend(title="Relationship Quality", bbox_to_anchor=(1, 1))
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            st.pyplot(fig2)
-        
-        # Chart 3 and Marital Status Stacked Bar
-        col3, col4 = st.columns(2)
-        
-        with col3:
-            st.subheader("Age Difference Distribution by Meeting Method")
-            fig3, ax3 = plt.subplots(figsize=(8, 5))
-            for method in df_filtered['q24_met_online'].unique():
-                subset = df_filtered[df_filtered['q24_met_online'] == method]
-                sns.histplot(
-                    subset['age_difference'],
-                    kde=True, bins=20,
-                    stat='percent',
-                    ax=ax3, label=method, alpha=0.5
-                )
-            ax3.set_xlabel("Age Difference (Years)")
-            ax3.set_ylabel("Percentage")
-            ax3.legend(title="Meeting Method")
-            plt.tight_layout()
-            st.pyplot(fig3)
-        
-        with col4:
-            st.subheader("Marital Status by Meeting Method (Stacked Bar Chart)")
-            if 'married' in df_filtered.columns:
-                marital_count = pd.crosstab(df_filtered['q24_met_online'], df_filtered['married'])
-                marital_pct = marital_count.div(marital_count.sum(axis=1), axis=0) * 100
-                fig5, ax5 = plt.subplots(figsize=(8, 5))
-                marital_pct.plot(kind='bar', stacked=True, ax=ax5, colormap='Set2')
-                ax5.set_xlabel("Meeting Method")
-                ax5.set_ylabel("Percentage of Couples (%)")
-                ax5.legend(title="Marital Status", bbox_to_anchor=(1, 1))
-                plt.tight_layout()
-                for container in ax5.containers:
-                    ax5.bar_label(container, fmt='%.1f%%', label_type='center')
-                st.pyplot(fig5)
-            else:
-                st.warning("No 'married' column found in the data.")
-
-
-    elif selected_dataset == "Global EV Data Explorer":
-        data.columns = (
-            data.columns.str.lower()
-            .str.replace(' ', '_')
-        )
-        
-        if st.checkbox("Show Original Data Table", key="ev_original"):
-            st.dataframe(data)
-        
-        # --- Sidebar Filters ---
-        st.sidebar.header("Filters")
-        
-        # Region Filter
-        regions = sorted(data['region'].dropna().unique())
-        selected_regions = st.sidebar.multiselect("Select Region(s):", options=regions, default=regions)
-        if not selected_regions:
-            selected_regions = regions
-        
-        # Year Filter
-        years = sorted(data['year'].dropna().astype(int).unique())
-        selected_years = st.sidebar.multiselect("Select Year(s):", options=years, default=years)
-        if not selected_years:
-            selected_years = years
-        
-        # Powertrain Filter
-        powertrains = sorted(data['powertrain'].dropna().unique())
-        selected_powertrains = st.sidebar.multiselect("Select Powertrain(s):", options=powertrains, default=powertrains)
-        if not selected_powertrains:
-            selected_powertrains = powertrains
-        
-        # Parameter Filter
-        parameters = sorted(data['parameter'].dropna().unique())
-        selected_parameters = st.sidebar.multiselect("Select Parameter(s):", options=parameters, default=parameters)
-        if not selected_parameters:
-            selected_parameters = parameters
-        
-        # --- Apply Filters ---
-        df_filtered = data[
-            (data['region'].isin(selected_regions)) &
-            (data['year'].isin(selected_years)) &
-            (data['powertrain'].isin(selected_powertrains)) &
-            (data['parameter'].isin(selected_parameters))
+def load_dataset(dataset_name):
+    config = titles_config[dataset_name]
+    modified = dataset_version(dataset_name)
+    return dataset_loaders[dataset_name](config["file"], config["dtypes"], config["usecols"], modified)
+
+@st.cache_data(max_entries=32)
+def filter_by_key(dataset_name, modified, filter_key):
+    # Memoized per dataset version and widget state, so reruns that leave the
+    # filters untouched (e.g. toggling the data table) reuse the previous result.
+    # Only the columns the charts use ("columns" in titles_config) are kept, so
+    # the copy made here, and the one each cache hit unpickles, stay small.
+    data, _ = load_dataset(dataset_name)
+    return apply_filters(data[titles_config[dataset_name]["columns"]], filter_key)
+
+def selection_key(filters):
+    # Selections are sorted into tuples so the same choice made in a different
+    # click order gives the same key, and only the option count is kept
+    # instead of the full option list.
+    return tuple(
+        (column, tuple(sorted(selected)), len(options))
+        for column, selected, options in filters
+    )
+
+def filter_dataset(dataset_name, data, filters):
+    # Nothing to narrow and no missing values to drop (the default state for
+    # some datasets): the loaded frame already is the result, so the cache
+    # lookup and the copy it hands back are skipped.
+    if all(len(selected) >= len(options) and not data[column].hasnans
+           for column, selected, options in filters):
+        return data
+    return filter_by_key(dataset_name, dataset_version(dataset_name), selection_key(filters))
+
+# --- Dataset Renderers ---
+def render_vgsales(dataset_name, data, filter_options, config):
+    if st.checkbox("Show Original Data Table", key="vgsales_original"):
+        st.dataframe(data)
+
+    st.sidebar.header("Filters")
+
+    years = filter_options['years']
+    selected_years = st.sidebar.multiselect("Select Year(s):", options=years, default=years)
+    if not selected_years:
+        selected_years = years
+
+    genres = filter_options['genres']
+    selected_genres = st.sidebar.multiselect("Select Genre(s):", options=genres, default=genres)
+    if not selected_genres:
+        selected_genres = genres
+
+    publishers = filter_options['publishers']
+    selected_publishers = st.sidebar.multiselect("Select Publisher(s):", options=publishers, default=publishers)
+    if not selected_publishers:
+        selected_publishers = publishers
+
+    # --- Apply Filters ---
+    filters = [
+        ('year', selected_years, years),
+        ('genre', selected_genres, genres),
+        ('publisher_filtered', selected_publishers, publishers)
+    ]
+    df_filtered = filter_dataset(dataset_name, data, filters)
+
+    # --- Key Metrics ---
+    st.header("Key Metrics (Filtered Data)")
+    col1, col2, col3 = st.columns(3)
+    sales_stats = df_filtered['global_sales'].agg(['sum', 'mean'])
+    total_sales = sales_stats['sum']
+    avg_sales_per_game = sales_stats['mean']
+    total_games = df_filtered.shape[0]
+    col1.metric("Total Global Sales (M)", f"{total_sales:,.2f}")
+    col2.metric("Avg. Sales per Game (M)", f"{avg_sales_per_game:.2f}")
+    col3.metric("Total Games", f"{total_games:,}")
+    st.markdown("---")
+
+    # --- Visualizations ---
+
+    # Chart 1: Top Genres by Sales (Bar Plot)
+    col1_viz, col2_viz = st.columns(2)
+    with col1_viz:
+        st.subheader(config["chart1_title"])
+        st.altair_chart(genre_sales_chart(df_filtered), use_container_width=True)
+
+    # Chart 2: Sales by Region (Stacked Bar Plot)
+    with col2_viz:
+        st.subheader(config["chart2_title"])
+        st.altair_chart(region_sales_chart(df_filtered), use_container_width=True)
+
+    # Chart 3: Games Released Over Time (Line Plot)
+    col3_viz, col4_viz = st.columns(2)
+    with col3_viz:
+        st.subheader(config["chart3_title"])
+        if len(selected_years) > 1:
+            st.altair_chart(yearly_counts_chart(df_filtered['year'], 'Year', 'Number of Games Released'),
+                            use_container_width=True)
+        elif len(selected_years) == 1:
+            st.write(f"Showing data only for {selected_years[0]}.")
+            count = int(count_by_year(df_filtered['year']).get(selected_years[0], 0))
+            st.metric(f"Games Released in {selected_years[0]}", count)
+        else:
+            st.write("Select multiple years to see trend.")
+
+    # Chart 4: Top Publishers by Sales (Bar Plot)
+    with col4_viz:
+        st.subheader("Top Publishers by Sales")
+        st.altair_chart(publisher_sales_chart(df_filtered), use_container_width=True)
+
+def render_mikro(dataset_name, data, filter_options, config):
+    if st.checkbox("Show Original Data Table", key="mikro_original"):
+        st.dataframe(data)
+
+    st.sidebar.header("Filters")
+
+    statuses = filter_options['statuses']
+    selected_statuses = st.sidebar.multiselect("Select Status:", options=statuses, default=statuses)
+    if not selected_statuses:
+        selected_statuses = statuses
+
+    reg_years = filter_options['reg_years']
+    selected_reg_years = st.sidebar.multiselect("Select Registration Year(s):", options=reg_years, default=reg_years)
+    if not selected_reg_years:
+        selected_reg_years = reg_years
+
+    dereg_years = filter_options['dereg_years']
+    selected_dereg_years = st.sidebar.multiselect("Select Deregistration Year(s):", options=dereg_years, default=dereg_years)
+    if not selected_dereg_years:
+        selected_dereg_years = dereg_years
+
+    # --- Apply Filters ---
+    filters = [
+        ('aktivs', selected_statuses, statuses),
+        ('registration_year', selected_reg_years, reg_years)
+    ]
+    df_filtered = filter_dataset(dataset_name, data, filters)
+    if 'no' in selected_statuses:
+        df_filtered = df_filtered[
+            (df_filtered['aktivs'] == 'active') |
+            ((df_filtered['aktivs'] == 'innactive') & (df_filtered['deregistration_year'].isin(selected_dereg_years)))
         ]
-        
-        # --- Key Metrics ---
-        st.header("Key Metrics (Filtered Data)")
-        col1, col2, col3 = st.columns(3)
-        total_sales = df_filtered[(df_filtered['parameter'] == 'EV sales') & (df_filtered['unit'] == 'Vehicles')]['value'].sum()
-        avg_sales_share = df_filtered[(df_filtered['parameter'] == 'EV sales share') & (df_filtered['unit'] == 'percent')]['value'].mean()
-        avg_stock_share = df_filtered[(df_filtered['parameter'] == 'EV stock share') & (df_filtered['unit'] == 'percent')]['value'].mean()
-        col1.metric("Total EV Sales (Vehicles)", f"{total_sales:,.0f}")
-        col2.metric("Avg. EV Sales Share (%)", f"{avg_sales_share:.2f}")
-        col3.metric("Avg. EV Stock Share (%)", f"{avg_stock_share:.2f}")
-        st.markdown("---")
-        
-        # --- Visualizations ---
-        sns.set_theme(style="whitegrid")
-        
-        # Chart 1: EV Sales Over Time by Powertrain (Line Plot)
-        col1_viz, col2_viz = st.columns(2)
-        with col1_viz:
-            st.subheader(config["chart1_title"])
-            sales_data = df_filtered[(df_filtered['parameter'] == 'EV sales') & (df_filtered['unit'] == 'Vehicles')]
-            if not sales_data.empty and len(selected_years) > 1:
-                fig1, ax1 = plt.subplots(figsize=(8, 5))
-                sns.lineplot(
-                    data=sales_data,
-                    x='year', y='value', hue='powertrain',
-                    marker='o', ax=ax1, palette='viridis'
-                )
-                ax1.set_xlabel('Year')
-                ax1.set_ylabel('EV Sales (Vehicles)')
-                ax1.legend(title='Powertrain')
-                plt.tight_layout()
-                st.pyplot(fig1)
-            elif len(selected_years) == 1:
-                st.write(f"Showing data only for year {selected_years[0]}.")
-                sales_year = sales_data[sales_data['year'] == selected_years[0]]['value'].sum()
-                st.metric(f"EV Sales in {selected_years[0]}", f"{sales_year:,.0f}")
-            else:
-                st.write("Select multiple years to see trend.")
-        
-
-        # Chart 2: EV Stock by Powertrain (Stacked Bar Plot)
-        with col2_viz:
-            st.subheader("EV Stock by Powertrain")
-            stock_data = df_filtered[(df_filtered['parameter'] == 'EV stock') & (df_filtered['unit'] == 'Vehicles')]
-            if not stock_data.empty and len(selected_years) > 1:
-                stock_pivot = stock_data.pivot_table(index='year', columns='powertrain', values='value', aggfunc='sum', fill_value=0)
-                fig4, ax4 = plt.subplots(figsize=(8, 5))
-                stock_pivot.plot(kind='bar', stacked=True, ax=ax4, colormap='rocket')
-                ax4.set_xlabel('Year')
-                ax4.set_ylabel('EV Stock (Vehicles)')
-                ax4.legend(title='Powertrain', bbox_to_anchor=(1, 1))
-                plt.tight_layout()
-                st.pyplot(fig4)
-            elif len(selected_years) == 1:
-                st.write(f"Showing data only for year {selected_years[0]}.")
-                stock_year = stock_data[stock_data['year'] == selected_years[0]]['value'].sum()
-                st.metric(f"EV Stock in {selected_years[0]}", f"{stock_year:,.0f}")
-            else:
-                st.write("Select multiple years to see trend.")
-
-        
-        mpl.rcParams['figure.dpi'] = 150
-
-        df_chart = df_filtered.copy()
-        st.subheader(config["chart4_title"])
-        stock_df = df_chart[
-            (df_chart['parameter'] == 'EV stock') & 
-            (df_chart['unit'] == 'Vehicles')
-        ].copy()
-
-        stock_df = stock_df[stock_df['powertrain'] != "FCEV"]
-
-        region_mapping = {
-            "china": "China",
-            "europe": "Europe",
-            "usa": "USA",
-            "rest of the world": "Rest of the world"
-        }
-        stock_df['region'] = stock_df['region'].astype(str).str.lower().str.strip().map(region_mapping)
+    figure_inputs = (
+        dataset_version(dataset_name),
+        selection_key(filters + [('deregistration_year', selected_dereg_years, dereg_years)])
+    )
 
-        stock_df = stock_df[stock_df['region'].notna()]
+    # --- Key Metrics ---
+    st.header("Key Metrics (Filtered Data)")
+    col1, col2, col3 = st.columns(3)
+    status_totals = df_filtered['aktivs'].value_counts()
+    total_taxpayers = len(df_filtered)
+    active_taxpayers = int(status_totals.get('active', 0))
+    inactive_taxpayers = int(status_totals.get('innactive', 0))
+    col1.metric("Total Taxpayers", f"{total_taxpayers:,}")
+    col2.metric("Active Taxpayers", f"{active_taxpayers:,}")
+    col3.metric("Inactive Taxpayers", f"{inactive_taxpayers:,}")
+    st.markdown("---")
 
-        stock_df['region_powertrain'] = stock_df['region'] + " " + stock_df['powertrain']
+    # --- Visualizations ---
 
-        stock_pivot = (
-            stock_df.groupby(['year', 'region_powertrain'])['value']
-            .sum()
-            .unstack(fill_value=0)
-            .sort_index()
-        )
+    # Chart 1: Distribution of Active vs Inactive Taxpayers (Pie Chart)
+    col1_viz, col2_viz = st.columns(2)
+    with col1_viz:
+        st.subheader(config["chart1_title"])
+        status_counts = status_totals[status_totals > 0]
+        show_figure('mikro_status', figure_inputs, draw_status_share, status_counts)
 
-        stock_pivot_million = stock_pivot / 1e6
+    # Chart 2: Registrations Over Time (Line Plot)
+    with col2_viz:
+        st.subheader(config["chart2_title"])
+        if len(selected_reg_years) > 1:
+            show_figure('mikro_registrations', figure_inputs, draw_yearly_counts,
+                        df_filtered['registration_year'], 'Registration Year', 'Number of Registrations')
+        elif len(selected_reg_years) == 1:
+            st.write(f"Showing data only for registration year {selected_reg_years[0]}.")
+            reg_count = int(count_by_year(df_filtered['registration_year']).get(selected_reg_years[0], 0))
+            st.metric(f"Registrations in {selected_reg_years[0]}", f"{reg_count:,}")
+        else:
+            st.write("Select multiple registration years to see trend.")
 
-        fig, ax = plt.subplots(figsize=(16, 10))
-        stock_pivot_million.plot(
-            kind='bar',
-            stacked=True,
-            ax=ax,
-            colormap='rocket'
-        )
+    # Chart 3: Deregistrations Over Time (Line Plot)
+    col3_viz, col4_viz = st.columns(2)
+    with col3_viz:
+        st.subheader(config["chart3_title"])
+        inactive_df = df_filtered[df_filtered['aktivs'] == 'innactive']
+        if len(selected_dereg_years) > 1 and not inactive_df.empty:
+            show_figure('mikro_deregistrations', figure_inputs, draw_yearly_counts,
+                        inactive_df['deregistration_year'], 'Deregistration Year', 'Number of Deregistrations')
+        elif len(selected_dereg_years) == 1 and not inactive_df.empty:
+            st.write(f"Showing data only for deregistration year {selected_dereg_years[0]}.")
+            dereg_count = int(count_by_year(inactive_df['deregistration_year']).get(selected_dereg_years[0], 0))
+            st.metric(f"Deregistrations in {selected_dereg_years[0]}", f"{dereg_count:,}")
+        else:
+            st.write("Select multiple deregistration years to see trend, or ensure inactive taxpayers are included.")
+
+
+    # Chart 4: Duration of Activity (Histogram)
+    with col4_viz:
+        st.subheader("Duration of Activity (Inactive Taxpayers)")
+        if not inactive_df.empty:
+            show_figure('mikro_duration', figure_inputs, draw_activity_duration, inactive_df)
+        else:
+            st.write("No inactive taxpayers in the filtered data to show duration.")
+
+def render_hcmst(dataset_name, data, filter_options, config):
+    if st.checkbox("Show Original Data Table", key="hcmst_original"):
+        st.dataframe(data)
+
+    # --- Sidebar Filters ---
+    st.sidebar.header("Filters")
+    meeting_methods = filter_options['meeting_methods']
+    selected_methods = st.sidebar.multiselect("Select Meeting Method(s):", options=meeting_methods, default=meeting_methods)
+    if not selected_methods:
+        selected_methods = meeting_methods
+
+    # --- Apply Filters ---
+    filters = [
+        ('q24_met_online', selected_methods, meeting_methods)
+    ]
+    df_filtered = filter_dataset(dataset_name, data, filters)
+    figure_inputs = (dataset_version(dataset_name), selection_key(filters))
+
+    # --- Key Metrics ---
+    st.header("Key Metrics (Filtered Data)")
+    col1, col2 = st.columns(2)
+    total_couples = df_filtered.shape[0]
+    avg_duration = df_filtered['how_long_relationship'].mean()
+    col1.metric("Total Couples", f"{total_couples}")
+    col2.metric("Avg. Relationship Duration (Years)", f"{avg_duration:.1f}")
+    st.markdown("---")
+
+    # --- Visualizations ---
 
-        ax.set_xlabel("Year", fontsize=16)
-        ax.set_ylabel("EV Stock (Million Vehicles)", fontsize=16)
-        ax.set_title("Global EV Stock Over Time by Region and Powertrain", fontsize=18)
-        ax.legend(title="Region + Powertrain", bbox_to_anchor=(1, 1), fontsize=12, title_fontsize=12)
-        plt.tight_layout()
-
-        st.pyplot(fig)
-        
-        # Chart 3: EV Stock Share Distribution (Histogram)
-        col3_viz, col4_viz = st.columns(2)
-        with col3_viz:
-            st.subheader(config["chart3_title"])
-            stock_share_data = df_filtered[(df_filtered['parameter'] == 'EV stock share') & (df_filtered['unit'] == 'percent')]
-            if not stock_share_data.empty:
-                fig3, ax3 = plt.subplots(figsize=(8, 5))
-                sns.histplot(
-                    data=stock_share_data,
-                    x='value', kde=True, bins=20,
-                    ax=ax3, color='skyblue'
-                )
-                ax3.set_xlabel('EV Stock Share (%)')
-                ax3.set_ylabel('Frequency')
-                plt.tight_layout()
-                st.pyplot(fig3)
-            else:
-                st.write("No EV stock share data available for the selected filters.")
-        
-        # Chart 4: EV Sales Share by Region (Bar Plot) - Modified to show overall average across all years
-        with col4_viz:
-            st.subheader(config["chart2_title"])
-            sales_share_data = df_filtered[(df_filtered['parameter'] == 'EV sales share') &
-                                        (df_filtered['unit'] == 'percent')]
-            if not sales_share_data.empty:
-                # Calculate the average EV sales share across all selected years for each region
-                sales_share_overall = sales_share_data.groupby('region')['value'].mean().reset_index()
-                # Increase figure height for more room and adjust the left margin
-                fig2, ax2 = plt.subplots(figsize=(12, 15))
-                sns.barplot(
-                    data=sales_share_overall,
-                    x='value', y='region',
-                    ax=ax2, palette='mako'
-                )
-                ax2.set_xlabel('Average EV Sales Share (%)', fontsize=12)
-                ax2.set_ylabel('Region', fontsize=12)
-                ax2.set_title('Overall EV Sales Share Across Selected Years', fontsize=14)
-                plt.subplots_adjust(left=0.3)  # Increase left margin to accommodate long y-axis labels
-                st.pyplot(fig2)
-            else:
-                st.write("No EV sales share data available for the selected filters.")  
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader(config["chart1_title"])
+        show_figure('hcmst_methods', figure_inputs, draw_meeting_methods, df_filtered)
+
+    with col2:
+        st.subheader(config["chart2_title"])
+        show_figure('hcmst_quality', figure_inputs, draw_quality_by_method, df_filtered)
+
+    # Chart 3 and Marital Status Stacked Bar
+    col3, col4 = st.columns(2)
+
+    with col3:
+        st.subheader("Age Difference Distribution by Meeting Method")
+        show_figure('hcmst_age_difference', figure_inputs, draw_age_difference, df_filtered)
+
+    with col4:
+        st.subheader("Marital Status by Meeting Method (Stacked Bar Chart)")
+        if 'married' in df_filtered.columns:
+            show_figure('hcmst_marital', figure_inputs, draw_marital_status, df_filtered)
+        else:
+            st.warning("No 'married' column found in the data.")
+
+def render_ev(dataset_name, data, filter_options, config):
+    if st.checkbox("Show Original Data Table", key="ev_original"):
+        st.dataframe(data)
+
+    # --- Sidebar Filters ---
+    st.sidebar.header("Filters")
+
+    # Region Filter
+    regions = filter_options['regions']
+    selected_regions = st.sidebar.multiselect("Select Region(s):", options=regions, default=regions)
+    if not selected_regions:
+        selected_regions = regions
+
+    # Year Filter
+    years = filter_options['years']
+    selected_years = st.sidebar.multiselect("Select Year(s):", options=years, default=years)
+    if not selected_years:
+        selected_years = years
+
+    # Powertrain Filter
+    powertrains = filter_options['powertrains']
+    selected_powertrains = st.sidebar.multiselect("Select Powertrain(s):", options=powertrains, default=powertrains)
+    if not selected_powertrains:
+        selected_powertrains = powertrains
+
+    # Parameter Filter
+    parameters = filter_options['parameters']
+    selected_parameters = st.sidebar.multiselect("Select Parameter(s):", options=parameters, default=parameters)
+    if not selected_parameters:
+        selected_parameters = parameters
+
+    # --- Apply Filters ---
+    filters = [
+        ('region', selected_regions, regions),
+        ('year', selected_years, years),
+        ('powertrain', selected_powertrains, powertrains),
+        ('parameter', selected_parameters, parameters)
+    ]
+    df_filtered = filter_dataset(dataset_name, data, filters)
+    figure_inputs = (dataset_version(dataset_name), selection_key(filters))
+
+    # --- Key Metrics ---
+    st.header("Key Metrics (Filtered Data)")
+    col1, col2, col3 = st.columns(3)
+    # One groupby split serves both the metrics and the charts
+    ev_slices = split_by(df_filtered, ['parameter', 'unit'])
+    no_rows = df_filtered.iloc[:0]
+    sales_data = ev_slices.get(('EV sales', 'Vehicles'), no_rows)
+    stock_data = ev_slices.get(('EV stock', 'Vehicles'), no_rows)
+    sales_share_data = ev_slices.get(('EV sales share', 'percent'), no_rows)
+    stock_share_data = ev_slices.get(('EV stock share', 'percent'), no_rows)
+    total_sales = sales_data['value'].sum()
+    avg_sales_share = mean_or_nan(sales_share_data['value'])
+    avg_stock_share = mean_or_nan(stock_share_data['value'])
+    col1.metric("Total EV Sales (Vehicles)", f"{total_sales:,.0f}")
+    col2.metric("Avg. EV Sales Share (%)", f"{avg_sales_share:.2f}")
+    col3.metric("Avg. EV Stock Share (%)", f"{avg_stock_share:.2f}")
+    st.markdown("---")
+
+    # --- Visualizations ---
+
+    # Chart 1: EV Sales Over Time by Powertrain (Line Plot)
+    col1_viz, col2_viz = st.columns(2)
+    with col1_viz:
+        st.subheader(config["chart1_title"])
+        if not sales_data.empty and len(selected_years) > 1:
+            st.altair_chart(ev_sales_chart(sales_data), use_container_width=True)
+        elif len(selected_years) == 1:
+            st.write(f"Showing data only for year {selected_years[0]}.")
+            sales_year = sales_data[sales_data['year'] == selected_years[0]]['value'].sum()
+            st.metric(f"EV Sales in {selected_years[0]}", f"{sales_year:,.0f}")
+        else:
+            st.write("Select multiple years to see trend.")
+
+
+    # Chart 2: EV Stock by Powertrain (Stacked Bar Plot)
+    with col2_viz:
+        st.subheader("EV Stock by Powertrain")
+        if not stock_data.empty and len(selected_years) > 1:
+            show_figure('ev_stock', figure_inputs, draw_ev_stock, stock_data)
+        elif len(selected_years) == 1:
+            st.write(f"Showing data only for year {selected_years[0]}.")
+            stock_year = stock_data[stock_data['year'] == selected_years[0]]['value'].sum()
+            st.metric(f"EV Stock in {selected_years[0]}", f"{stock_year:,.0f}")
+        else:
+            st.write("Select multiple years to see trend.")
+
+    st.subheader(config["chart4_title"])
+    # Large figures are saved at a lower dpi: at 200 they come out well past
+    # the width the browser shows them at
+    show_figure('ev_stock_global', figure_inputs, draw_global_ev_stock, stock_data, figsize=(16, 10), dpi=120)
+
+    # Chart 3: EV Stock Share Distribution (Histogram)
+    col3_viz, col4_viz = st.columns(2)
+    with col3_viz:
+        st.subheader(config["chart3_title"])
+        if not stock_share_data.empty:
+            show_figure('ev_stock_share', figure_inputs, draw_stock_share, stock_share_data)
+        else:
+            st.write("No EV stock share data available for the selected filters.")
+
+    # Chart 4: EV Sales Share by Region (Bar Plot) - Modified to show overall average across all years
+    with col4_viz:
+        st.subheader(config["chart2_title"])
+        if not sales_share_data.empty:
+            # Increase figure height for more room and adjust the left margin
+            show_figure('ev_sales_share', figure_inputs, draw_sales_share, sales_share_data,
+                        figsize=(12, 15), layout=None, dpi=100)
+        else:
+            st.write("No EV sales share data available for the selected filters.")  
+
+dataset_renderers = {
+    "Global Video Game Sales": render_vgsales,
+    "Micro-enterprise Tax Payers": render_mikro,
+    "How Couples Meet and Stay Together": render_hcmst,
+    "Global EV Data Explorer": render_ev
+}
+
+# --- Sidebar: Dataset Selection ---
+selected_dataset = st.sidebar.selectbox("Select a dataset:", dataset_options)
+config = titles_config[selected_dataset]
+data, filter_options = load_dataset(selected_dataset)
+
+# --- Main Title ---
+st.title(config["main_title"])
+
+if data is not None:
+    dataset_renderers[selected_dataset](selected_dataset, data, filter_options, config)
 else:
     st.error("Failed to load data.")